@@ -0,0 +1,65 @@
+import json
+import os
+
+import click
+from llama_index.core.schema import ImageDocument
+from llama_index.core.utils import get_tokenizer
+
+from src.loader import SUMMARY_PROMPT, load_documents
+from src.prompt_format import encode_document, encode_summaries
+from src.tree_generator import FILE_PROMPT
+
+
+def count_tokens(text):
+    # llama_index's default tokenizer is tiktoken's GPT encoding, not Llama's,
+    # so read the numbers as a comparison between formats, not exact counts.
+    return len(get_tokenizer()(text))
+
+
+def placeholder_summary(text):
+    # Real summaries need an LLM call; a fixed-length excerpt is close enough
+    # to compare the overhead of the two encodings.
+    return " ".join(text.split())[:300] or "empty file"
+
+
+@click.command()
+@click.argument("src_path", type=click.Path(exists=True))
+def main(src_path):
+    """Compare prompt token counts of the JSON and compact wire formats,
+    as counted by a GPT tokenizer."""
+    docs = [d for d in load_documents(src_path) if not isinstance(d, ImageDocument)]
+    if not docs:
+        click.echo("No text documents found.")
+        return
+
+    json_docs = compact_docs = 0
+    json_summaries = []
+    for d in docs:
+        doc = {"content": d.text, **d.metadata}
+        json_docs += count_tokens(json.dumps(doc))
+        compact_docs += count_tokens(encode_document(doc))
+
+        summary = placeholder_summary(d.text)
+        # Same shape get_dir_summaries hands to create_file_tree
+        json_summaries.append(
+            {"file_path": os.path.relpath(d.metadata["file_path"], src_path),
+             "summary": summary}
+        )
+
+    json_plan = count_tokens(json.dumps(json_summaries))
+    compact_plan = count_tokens(encode_summaries(json_summaries))
+
+    click.echo(f"{len(docs)} documents")
+    click.echo(f"{'':<22}{'json':>10}{'compact':>10}{'saved':>8}")
+    for name, before, after in [
+        ("summarizer (user)", json_docs, compact_docs),
+        ("planner (user)", json_plan, compact_plan),
+    ]:
+        saved = 100 * (before - after) / before if before else 0
+        click.echo(f"{name:<22}{before:>10}{after:>10}{saved:>7.1f}%")
+    click.echo(f"summarizer system prompt: {count_tokens(SUMMARY_PROMPT)} tokens")
+    click.echo(f"planner system prompt: {count_tokens(FILE_PROMPT)} tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 import pathlib
@@ -49,6 +50,9 @@ class CommitRequest(BaseModel):
 
 app = FastAPI()
 
+# Handlers of running watch streams, so commits can register their own moves
+watch_handlers = []
+
 origins = [
     "*"
 ]
@@ -114,17 +118,26 @@ async def watch(request: Request):
     observer = Observer()
     event_handler = Handler(path, create_watch_file_tree, response_queue)
     await event_handler.set_summaries()
+    watch_handlers.append(event_handler)
     observer.schedule(event_handler, path, recursive=True)
     observer.start()
 
     # background_tasks.add_task(observer.start)
 
-    def stream():
-        while True:
-            response = response_queue.get()
-            yield json.dumps(response) + "\n"
-            # yield json.dumps({"status": "watching"}) + "\n"
-            # time.sleep(5)
+    async def stream():
+        try:
+            while True:
+                response = await asyncio.to_thread(response_queue.get)
+                yield json.dumps(response) + "\n"
+                # yield json.dumps({"status": "watching"}) + "\n"
+                # time.sleep(5)
+        finally:
+            # The client went away; stop watching and unregister from commits
+            watch_handlers.remove(event_handler)
+            observer.stop()
+            event_handler.stop()
+            # Unblock the worker thread still waiting on the queue
+            response_queue.put(None)
 
     return StreamingResponse(stream())
 
@@ -150,16 +163,27 @@ async def commit(request: CommitRequest):
     dst_directory = os.path.dirname(dst)
     os.makedirs(dst_directory, exist_ok=True)
 
+    # If src is a file and dst is a directory, move the file into dst with the original filename.
+    if os.path.isfile(src) and os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+
+    # Keep watchers from re-summarizing and replanning on our own move
+    handlers = list(watch_handlers)
+    for handler in handlers:
+        handler.expect_move(src, dst)
+
     try:
-        # If src is a file and dst is a directory, move the file into dst with the original filename.
-        if os.path.isfile(src) and os.path.isdir(dst):
-            shutil.move(src, os.path.join(dst, os.path.basename(src)))
-        else:
-            shutil.move(src, dst)
+        # shutil.move may still nest a directory inside an existing dst, so
+        # use the path it actually moved to
+        moved_to = shutil.move(src, dst)
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"An error occurred while moving the resource: {e}"
         )
 
+    # Only now that the move succeeded do the cached summaries follow it
+    for handler in handlers:
+        handler.move_completed(src, moved_to)
+
     return {"message": "Commit successful"}
@@ -0,0 +1,265 @@
+import asyncio
+import os
+import threading
+import time
+import weakref
+from collections import deque
+
+import ollama
+from groq import AsyncGroq
+from termcolor import colored
+
+
+class BackendUnavailable(RuntimeError):
+    """Raised when every backend's circuit breaker is refusing requests."""
+
+
+class CircuitBreaker:
+    """Stops routing to a backend after repeated failures. Once
+    `reset_timeout` seconds have passed it goes half-open and lets a single
+    probe request through; the probe's outcome closes or re-opens it."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.probe_in_flight = False
+        # The FastAPI loop and the background sync loop share breakers
+        self.lock = threading.Lock()
+
+    def allow_request(self):
+        """Return whether a request may be sent now. In the half-open state
+        this hands out the single probe slot, so only call it right before
+        actually sending."""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.state = self.CLOSED
+            self.opened_at = None
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+
+    def record_cancel(self):
+        # A cancelled probe says nothing about the backend; free the slot
+        with self.lock:
+            self.probe_in_flight = False
+
+
+class Backend:
+    """A chat completion provider that returns the raw JSON string reply."""
+
+    def __init__(self, name):
+        self.name = name
+        self.breaker = CircuitBreaker()
+        # Async clients are bound to the event loop they were created on, so
+        # keep one per loop and let it go along with its loop
+        self._clients = weakref.WeakKeyDictionary()
+
+    def client(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._clients:
+            self._clients[loop] = self.make_client()
+        return self._clients[loop]
+
+    def make_client(self):
+        raise NotImplementedError
+
+    async def complete(self, messages):
+        raise NotImplementedError
+
+
+class GroqBackend(Backend):
+    def __init__(self, model="llama-3.1-70b-versatile"):
+        super().__init__("groq")
+        self.model = model
+
+    def make_client(self):
+        # The Groq SDK honours GROQ_BASE_URL, which is how a local stand-in
+        # server can be substituted for the real API.
+        return AsyncGroq(api_key=os.environ.get("GROQ_API_KEY"), max_retries=0)
+
+    async def complete(self, messages):
+        chat_completion = await self.client().chat.completions.create(
+            messages=messages,
+            model=self.model,
+            response_format={"type": "json_object"},
+            temperature=0,
+        )
+        return chat_completion.choices[0].message.content
+
+
+class OllamaBackend(Backend):
+    def __init__(self, model="llama3.1", host=None):
+        super().__init__("ollama")
+        self.model = model
+        self.host = host
+
+    def make_client(self):
+        return ollama.AsyncClient(host=self.host)
+
+    async def complete(self, messages):
+        chat_completion = await self.client().chat(
+            messages=messages,
+            model=self.model,
+            format="json",
+            options={"temperature": 0},
+        )
+        return chat_completion["message"]["content"]
+
+
+class HedgedRouter:
+    """Sends each request to the primary backend and, if it has not answered
+    by the configured latency percentile, duplicates it to the secondary.
+    The first successful reply wins and the other request is cancelled.
+    If every backend's circuit breaker is open, requests fail fast with
+    BackendUnavailable instead of piling onto a failing backend."""
+
+    def __init__(
+        self,
+        primary,
+        secondary=None,
+        percentile=95,
+        initial_delay=2.0,
+        min_samples=10,
+        window=200,
+    ):
+        self.primary = primary
+        self.secondary = secondary
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+
+    def hedge_delay(self):
+        if len(self.latencies) < self.min_samples:
+            return self.initial_delay
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return ordered[index]
+
+    async def _call(self, backend, messages):
+        start = time.monotonic()
+        try:
+            content = await backend.complete(messages)
+        except asyncio.CancelledError:
+            backend.breaker.record_cancel()
+            if backend is self.primary:
+                # The hedge won. The elapsed time is only a lower bound, but
+                # dropping it would leave the window with fast samples only
+                # and drag the hedge delay down over time.
+                self.latencies.append(time.monotonic() - start)
+            raise
+        except Exception:
+            backend.breaker.record_failure()
+            raise
+        backend.breaker.record_success()
+        if backend is self.primary:
+            self.latencies.append(time.monotonic() - start)
+        return content
+
+    async def complete(self, messages):
+        first, hedge = self.primary, self.secondary
+        if not first.breaker.allow_request():
+            if hedge is None or not hedge.breaker.allow_request():
+                raise BackendUnavailable(
+                    "All backends are failing; waiting for their circuit breakers to reset"
+                )
+            first, hedge = hedge, None
+
+        first_task = asyncio.ensure_future(self._call(first, messages))
+        pending = {first_task}
+        error = None
+
+        try:
+            if hedge is not None:
+                done, pending = await asyncio.wait(
+                    pending, timeout=self.hedge_delay()
+                )
+                if done:
+                    if first_task.exception() is None:
+                        return first_task.result()
+                    error = first_task.exception()
+                if hedge.breaker.allow_request():
+                    print(colored(
+                        f"Hedging request from {first.name} to {hedge.name}",
+                        "yellow",
+                    ))
+                    pending.add(asyncio.ensure_future(self._call(hedge, messages)))
+
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise error
+
+
+def make_router_from_env():
+    secondary = None
+    if os.environ.get("LLAMAFS_SECONDARY_MODEL"):
+        secondary = OllamaBackend(
+            model=os.environ["LLAMAFS_SECONDARY_MODEL"],
+            host=os.environ.get("LLAMAFS_SECONDARY_HOST"),
+        )
+    return HedgedRouter(
+        GroqBackend(),
+        secondary,
+        percentile=float(os.environ.get("LLAMAFS_HEDGE_PERCENTILE", 95)),
+        initial_delay=float(os.environ.get("LLAMAFS_HEDGE_INITIAL_DELAY", 2.0)),
+    )
+
+
+_router = None
+
+
+def get_router():
+    global _router
+    if _router is None:
+        _router = make_router_from_env()
+    return _router
+
+
+_sync_loop = None
+_sync_loop_lock = threading.Lock()
+
+
+def run_sync(coro):
+    """Run a coroutine from synchronous code, such as the watchdog thread.
+    All such calls share one background loop so backend clients and their
+    connection pools are reused rather than rebuilt by every asyncio.run."""
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _sync_loop).result()
@@ -1,18 +1,36 @@
 import asyncio
 import json
 import os
+import random
 from collections import defaultdict
 
 import agentops
 import colorama
 import ollama
 import weave
-from groq import AsyncGroq, Groq
 from llama_index.core import Document, SimpleDirectoryReader
 from llama_index.core.schema import ImageDocument
 from llama_index.core.node_parser import TokenTextSplitter
 from termcolor import colored
 
+from src.hedging import get_router, run_sync
+from src.prompt_format import encode_document
+
+
+# Kept byte-for-byte identical across calls so provider prefix caching applies.
+# The file path is filled in locally, so the model only returns the summary.
+SUMMARY_PROMPT = """
+You will be provided with the contents of a file preceded by a few lines of metadata. Provide a summary of the contents. The purpose of the summary is to organize files based on their content. To this end provide a concise but informative summary. Make the summary as specific to the file as possible.
+
+Write your response a JSON object with the following schema:
+
+```json
+{
+    "summary": "summary of the content"
+}
+```
+""".strip()
+
 
 @agentops.record_function("get directory summaries")
 async def get_dir_summaries(path: str):
@@ -87,39 +105,33 @@ def process_metadata(doc_dicts):
     return metadata_list
 
 
-async def summarize_document(doc, client):
-    PROMPT = """
-You will be provided with the contents of a file along with its metadata. Provide a summary of the contents. The purpose of the summary is to organize files based on their content. To this end provide a concise but informative summary. Make the summary as specific to the file as possible.
-
-Write your response a JSON object with the following schema:
-
-```json
-{
-    "file_path": "path to the file including name",
-    "summary": "summary of the content"
-}
-```
-""".strip()
-
+async def complete_summary(doc):
+    # Slow or failing calls are hedged to the secondary backend, if configured.
+    # Retries back off exponentially so a burst of rate limit errors does not
+    # burn through every attempt at once.
+    router = get_router()
     max_retries = 5
     attempt = 0
-    while attempt < max_retries:
+    while True:
         try:
-            chat_completion = client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": PROMPT},
-                    {"role": "user", "content": json.dumps(doc)},
-                ],
-                model="llama-3.1-70b-versatile",
-                response_format={"type": "json_object"},
-                temperature=0,
+            return await router.complete(
+                [
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": encode_document(doc)},
+                ]
             )
-            break
         except Exception as e:
-            print("Error status {}".format(e.status_code))
             attempt += 1
+            print("Error {}".format(e))
+            if attempt >= max_retries:
+                raise
+            await asyncio.sleep(min(2 ** attempt, 30) * random.uniform(0.5, 1.5))
+
 
-    summary = json.loads(chat_completion.choices[0].message.content)
+async def summarize_document(doc):
+    content = await complete_summary(doc)
+    summary = json.loads(content)
+    summary["file_path"] = doc.get("file_path")
 
     try:
         # Print the filename in green
@@ -134,7 +146,7 @@ Write your response a JSON object with the following schema:
     return summary
 
 
-async def summarize_image_document(doc: ImageDocument, client):
+async def summarize_image_document(doc: ImageDocument):
     PROMPT = """
 You will be provided with an image along with its metadata. Provide a summary of the image contents. The purpose of the summary is to organize files based on their content. To this end provide a concise but informative summary. Make the summary as specific to the file as possible.
 
@@ -177,22 +189,24 @@ Write your response a JSON object with the following schema:
     return summary
 
 
-async def dispatch_summarize_document(doc, client):
+async def dispatch_summarize_document(doc):
     if isinstance(doc, ImageDocument):
-        return await summarize_image_document(doc, client)
+        return await summarize_image_document(doc)
     elif isinstance(doc, Document):
-        return await summarize_document({"content": doc.text, **doc.metadata}, client)
+        return await summarize_document({"content": doc.text, **doc.metadata})
     else:
         raise ValueError("Document type not supported")
 
 
 async def get_summaries(documents):
-    client = Groq(
-        api_key=os.environ.get("GROQ_API_KEY"),
-    )
-    summaries = await asyncio.gather(
-        *[dispatch_summarize_document(doc, client) for doc in documents]
-    )
+    # Cap how many documents are summarized at once to stay under rate limits
+    semaphore = asyncio.Semaphore(int(os.environ.get("LLAMAFS_MAX_CONCURRENCY", 8)))
+
+    async def summarize(doc):
+        async with semaphore:
+            return await dispatch_summarize_document(doc)
+
+    summaries = await asyncio.gather(*[summarize(doc) for doc in documents])
     return summaries
 
 
@@ -220,52 +234,29 @@ def merge_summary_documents(summaries, metadata_list):
 
 
 def get_file_summary(path: str):
-    client = Groq(
-        api_key=os.environ.get("GROQ_API_KEY"),
-    )
     reader = SimpleDirectoryReader(input_files=[path]).iter_data()
 
     docs = next(reader)
     splitter = TokenTextSplitter(chunk_size=6144)
     text = splitter.split_text("\n".join([d.text for d in docs]))[0]
     doc = Document(text=text, metadata=docs[0].metadata)
-    summary = dispatch_summarize_document_sync(doc, client)
+    summary = dispatch_summarize_document_sync(doc)
     return summary
 
 
-def dispatch_summarize_document_sync(doc, client):
+def dispatch_summarize_document_sync(doc):
     if isinstance(doc, ImageDocument):
-        return summarize_image_document_sync(doc, client)
+        return summarize_image_document_sync(doc)
     elif isinstance(doc, Document):
-        return summarize_document_sync({"content": doc.text, **doc.metadata}, client)
+        return summarize_document_sync({"content": doc.text, **doc.metadata})
     else:
         raise ValueError("Document type not supported")
 
 
-def summarize_document_sync(doc, client):
-    PROMPT = """
-You will be provided with the contents of a file along with its metadata. Provide a summary of the contents. The purpose of the summary is to organize files based on their content. To this end provide a concise but informative summary. Make the summary as specific to the file as possible.
-
-Write your response a JSON object with the following schema:
-    
-```json 
-{
-    "file_path": "path to the file including name",
-    "summary": "summary of the content"
-}
-```
-""".strip()
-
-    chat_completion = client.chat.completions.create(
-        messages=[
-            {"role": "system", "content": PROMPT},
-            {"role": "user", "content": json.dumps(doc)},
-        ],
-        model="llama-3.1-70b-versatile",
-        response_format={"type": "json_object"},
-        temperature=0,
-    )
-    summary = json.loads(chat_completion.choices[0].message.content)
+def summarize_document_sync(doc):
+    content = run_sync(complete_summary(doc))
+    summary = json.loads(content)
+    summary["file_path"] = doc.get("file_path")
 
     try:
         # Print the filename in green
@@ -280,7 +271,7 @@ Write your response a JSON object with the following schema:
     return summary
 
 
-def summarize_image_document_sync(doc: ImageDocument, client):
+def summarize_image_document_sync(doc: ImageDocument):
     client = ollama.Client()
     chat_completion = client.chat(
         messages=[
@@ -0,0 +1,36 @@
+# Metadata that actually helps the model name and place a file. Everything
+# else llama_index attaches (sizes, access times, absolute paths) is noise.
+DOCUMENT_FIELDS = {
+    "file_name": "file",
+    "file_type": "type",
+    "last_modified_date": "modified",
+}
+
+
+def _one_line(text):
+    return " ".join(str(text).split())
+
+
+def encode_document(doc: dict):
+    """Encode a {"content": ..., **metadata} document as a short header
+    followed by the raw content, instead of JSON with every metadata key."""
+    header = [
+        f"{label}: {doc[field]}"
+        for field, label in DOCUMENT_FIELDS.items()
+        if doc.get(field)
+    ]
+    return "\n".join(header) + "\n\n" + doc.get("content", "")
+
+
+def encode_summaries(summaries: list):
+    """Encode summaries as a tab separated table. Paths are the ones already
+    made relative to the directory being organized, so the model can place
+    files anywhere under it and replies need no translation."""
+    rows = ["path\tsummary"]
+    for s in summaries:
+        rows.append(f"{s['file_path']}\t{_one_line(s['summary'])}")
+    return "\n".join(rows)
+
+
+def encode_events(events: list):
+    return "\n".join(f"{e['src_path']} -> {e['dst_path']}" for e in events)
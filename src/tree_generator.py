@@ -2,8 +2,10 @@ from groq import Groq
 import json
 import os
 
+from src.prompt_format import encode_summaries
+
 FILE_PROMPT = """
-You will be provided with list of source files and a summary of their contents. For each file, propose a new path and filename, using a directory structure that optimally organizes the files using known conventions and best practices.
+You will be provided with a tab separated table of source files and a summary of their contents. Paths are relative to the directory being organized, and all paths in your response must be relative to it too. For each file, propose a new path and filename, using a directory structure that optimally organizes the files using known conventions and best practices.
 Follow good naming conventions. Here are a few guidelines
 - Think about your files : What related files are you working with?
 - Identify metadata (for example, date, sample, experiment) : What information is needed to easily locate a specific file?
@@ -28,11 +30,12 @@ Your response must be a JSON object with the following schema:
 
 
 def create_file_tree(summaries: list, session):
+    table = encode_summaries(summaries)
     client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
     chat_completion = client.chat.completions.create(
         messages=[
             {"role": "system", "content": FILE_PROMPT},
-            {"role": "user", "content": json.dumps(summaries)},
+            {"role": "user", "content": table},
         ],
         model="llama-3.1-70b-versatile",
         response_format={"type": "json_object"},  # Uncomment if needed
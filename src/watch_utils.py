@@ -1,13 +1,16 @@
 import asyncio
 import json
 import os
+import threading
 import time
+from queue import SimpleQueue
 
 from groq import Groq
 from watchdog.events import FileSystemEvent, FileSystemEventHandler
 from watchdog.observers import Observer
 
 from src.loader import get_dir_summaries, get_file_summary
+from src.prompt_format import encode_events, encode_summaries
 
 
 class Handler(FileSystemEventHandler):
@@ -16,28 +19,115 @@ class Handler(FileSystemEventHandler):
         self.callback = callback
         self.queue = queue
         self.events = []
+        self.summaries = []
+        self.summaries_cache = {}
+        # Paths touched by LlamaFS's own commits, mapped to when to stop
+        # ignoring events for them
+        self.expected_paths = {}
+        self.lock = threading.Lock()
+        # Summaries and replans run on their own thread so watchdog's thread
+        # only filters events and checks suppression as they arrive, not
+        # after waiting behind LLM calls for earlier events
+        self.work = SimpleQueue()
+        threading.Thread(target=self.run_work, daemon=True).start()
         print(f"Watching directory {base_path}")
 
+    def run_work(self):
+        while True:
+            job = self.work.get()
+            if job is None:
+                return
+            try:
+                job()
+            except Exception as e:
+                print(f"Error handling filesystem event: {e}")
+
+    def stop(self):
+        self.work.put(None)
+
     async def set_summaries(self):
         print(f"Getting summaries for {self.base_path}")
         self.summaries = await get_dir_summaries(self.base_path)
         self.summaries_cache = {s["file_path"]: s for s in self.summaries}
 
+    def relpath(self, path):
+        path = os.path.relpath(path, self.base_path)
+        if path == os.pardir or path.startswith(os.pardir + os.sep):
+            return None
+        return path
+
+    def expect_move(self, src_path, dst_path, ttl=5.0):
+        """Register a move LlamaFS is about to make, so the events it causes
+        are ignored instead of triggering new summaries and a replan."""
+        src_path, dst_path = self.relpath(src_path), self.relpath(dst_path)
+        if src_path is None:
+            # Files moved in from outside have no summary yet, so let their
+            # events through as usual
+            return
+        with self.lock:
+            expires = time.monotonic() + ttl
+            for path in (src_path, dst_path):
+                if path is not None:
+                    self.expected_paths[path] = expires
+
+    def move_completed(self, src_path, dst_path, ttl=5.0):
+        """Move cached summaries along with a finished move. Suppression is
+        extended from now, since a cross-device move can outlast the
+        original window and its events may still be arriving."""
+        self.expect_move(src_path, dst_path, ttl)
+        src_path, dst_path = self.relpath(src_path), self.relpath(dst_path)
+        if src_path is None:
+            return
+        with self.lock:
+            for path in list(self.summaries_cache):
+                if path != src_path and not path.startswith(src_path + os.sep):
+                    continue
+                summary = self.summaries_cache.pop(path)
+                if dst_path is not None:
+                    new_path = dst_path + path[len(src_path):]
+                    self.summaries_cache[new_path] = {**summary, "file_path": new_path}
+            self.summaries = list(self.summaries_cache.values())
+
+    def is_expected(self, *paths):
+        with self.lock:
+            return self._is_expected(*paths)
+
+    def _is_expected(self, *paths):
+        # Caller holds self.lock
+        now = time.monotonic()
+        self.expected_paths = {
+            p: t for p, t in self.expected_paths.items() if t > now
+        }
+        return any(
+            path == p or path.startswith(p + os.sep)
+            for path in paths
+            for p in self.expected_paths
+        )
+
     def update_summary(self, file_path):
         print(f"Updating summary for {file_path}")
         path = os.path.join(self.base_path, file_path)
         if not os.path.exists(path):
-            self.summaries_cache.pop(file_path)
+            with self.lock:
+                self.summaries_cache.pop(file_path, None)
+                self.summaries = list(self.summaries_cache.values())
             return
-        self.summaries_cache[file_path] = get_file_summary(path)
-        self.summaries = list(self.summaries_cache.values())
+        # Summarize outside the lock so commits are not held up by the LLM call
+        summary = {**get_file_summary(path), "file_path": file_path}
+        with self.lock:
+            # A commit may have moved the file while it was being summarized;
+            # its cache entry has already followed it, so drop this result
+            if not os.path.exists(path) or self._is_expected(file_path):
+                return
+            self.summaries_cache[file_path] = summary
+            self.summaries = list(self.summaries_cache.values())
         self.queue.put(
             {
                 "files": [
                     {
                         "src_path": file_path,
                         "dst_path": file_path,
-                        "summary": self.summaries_cache[file_path]["summary"],
+                        "summary": summary["summary"],
                     }
                 ]
             }
@@ -45,43 +135,51 @@ class Handler(FileSystemEventHandler):
 
     def on_created(self, event: FileSystemEvent) -> None:
         src_path = os.path.relpath(event.src_path, self.base_path)
+        if self.is_expected(src_path):
+            return
         print(f"Created {src_path}")
         if not event.is_directory:
-            self.update_summary(src_path)
+            self.work.put(lambda: self.update_summary(src_path))
 
     def on_deleted(self, event: FileSystemEvent) -> None:
         src_path = os.path.relpath(event.src_path, self.base_path)
+        if self.is_expected(src_path):
+            return
         print(f"Deleted {src_path}")
         if not event.is_directory:
-            self.update_summary(src_path)
+            self.work.put(lambda: self.update_summary(src_path))
 
     def on_modified(self, event: FileSystemEvent) -> None:
         src_path = os.path.relpath(event.src_path, self.base_path)
+        if self.is_expected(src_path):
+            return
         print(f"Modified {src_path}")
         if not event.is_directory:
-            self.update_summary(src_path)
+            self.work.put(lambda: self.update_summary(src_path))
 
     def on_moved(self, event: FileSystemEvent) -> None:
         src_path = os.path.relpath(event.src_path, self.base_path)
         dest_path = os.path.relpath(event.dest_path, self.base_path)
+        if self.is_expected(src_path, dest_path):
+            return
         print(f"Moved {src_path} > {dest_path}")
+        self.work.put(lambda: self.record_move(src_path, dest_path))
+
+    def record_move(self, src_path, dest_path):
         self.events.append({"src_path": src_path, "dst_path": dest_path})
         self.update_summary(src_path)
         self.update_summary(dest_path)
         print("Summaries: ", self.summaries)
         print("Events: ", self.events)
-        files = self.callback(
-            summaries=self.summaries, fs_events=json.dumps(
-                {"files": self.events})
-        )
+        files = self.callback(summaries=self.summaries, fs_events=self.events)
 
         self.queue.put(files)
 
 
-def create_file_tree(summaries, fs_events):
-
-    FILE_PROMPT = """
-You will be provided with list of source files and a summary of their contents. For each file, propose a new path and filename, using a directory structure that optimally organizes the files using known conventions and best practices.
+# Both prompts are constant so provider prefix caching applies; the recent
+# moves are sent in the user message rather than interpolated here.
+FILE_PROMPT = """
+You will be provided with a tab separated table of source files and a summary of their contents. Paths are relative to the directory being organized, and all paths in your response must be relative to it too. For each file, propose a new path and filename, using a directory structure that optimally organizes the files using known conventions and best practices.
 
 If the file is already named well or matches a known convention, set the destination path to the same as the source path.
 
@@ -98,23 +196,23 @@ Your response must be a JSON object with the following schema:
 ```
 """.strip()
 
-    WATCH_PROMPT = f"""
-Here are a few examples of good file naming conventions to emulate, based on the files provided:
-
-```json
-{fs_events}
-```
+WATCH_PROMPT = """
+The next message lists recent moves made by the user, one per line as `src_path -> dst_path`. They are examples of good file naming conventions to emulate.
 
-Include the above items in your response exactly as is, along all other proposed changes.
+Include these moves in your response exactly as is, along all other proposed changes.
 """.strip()
 
+
+def create_file_tree(summaries, fs_events):
+    table = encode_summaries(summaries)
+
     client = Groq()
     cmpl = client.chat.completions.create(
         messages=[
             {"content": FILE_PROMPT, "role": "system"},
-            {"content": json.dumps(summaries), "role": "user"},
+            {"content": table, "role": "user"},
             {"content": WATCH_PROMPT, "role": "system"},
-            {"content": json.dumps(fs_events), "role": "user"},
+            {"content": encode_events(fs_events), "role": "user"},
         ],
         model="llama-3.1-70b-versatile",
         response_format={"type": "json_object"},
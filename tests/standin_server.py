@@ -0,0 +1,97 @@
+"""Local stand-in for the Groq and Ollama chat APIs with injectable latency
+and failures. Used by the tests, or run directly and point GROQ_BASE_URL or
+LLAMAFS_SECONDARY_HOST at it:
+
+    python -m tests.standin_server --port 8001 --delay 1.5 --status 429
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, delay=0.0, status=200, content='{"summary": "stand-in"}'):
+        super().__init__(("127.0.0.1", port), StandinHandler)
+        self.delay = delay
+        self.status = status
+        self.content = content
+        self.requests = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        server.requests += 1
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(server.delay)
+
+        status = server.status
+        if status != 200:
+            reply = {"error": {"message": "injected failure", "type": "standin"}}
+        elif self.path.endswith("/chat/completions"):
+            # Groq / OpenAI chat completion
+            reply = {
+                "id": "standin",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": server.content},
+                        "finish_reason": "stop",
+                    }
+                ],
+            }
+        elif self.path == "/api/chat":
+            # Ollama chat
+            reply = {
+                "model": body["model"],
+                "created_at": "2024-01-01T00:00:00Z",
+                "message": {"role": "assistant", "content": server.content},
+                "done": True,
+            }
+        else:
+            status = 404
+            reply = {"error": "not found"}
+
+        data = json.dumps(reply).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the request, e.g. because a hedge won
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--status", type=int, default=200)
+    args = parser.parse_args()
+    with StandinServer(args.port, args.delay, args.status) as server:
+        print(f"Stand-in server listening on {server.url}")
+        threading.Event().wait()
@@ -0,0 +1,215 @@
+import asyncio
+import time
+
+import pytest
+
+from src.hedging import (
+    Backend,
+    BackendUnavailable,
+    CircuitBreaker,
+    GroqBackend,
+    HedgedRouter,
+    OllamaBackend,
+    run_sync,
+)
+from tests.standin_server import StandinServer
+
+
+class FakeBackend(Backend):
+    """Stand-in backend with injected latency and failures."""
+
+    def __init__(self, name, delay=0.0, fail=False):
+        super().__init__(name)
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    async def complete(self, messages):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.name} failed")
+        return self.name
+
+
+def run(router, times=1):
+    async def go():
+        results = [await router.complete([]) for _ in range(times)]
+        # Let cancelled tasks run their cleanup
+        await asyncio.sleep(0.01)
+        return results
+
+    return asyncio.run(go())
+
+
+def test_fast_primary_is_not_hedged():
+    primary, secondary = FakeBackend("primary", 0.01), FakeBackend("secondary")
+    router = HedgedRouter(primary, secondary, initial_delay=0.2)
+    assert run(router) == ["primary"]
+    assert secondary.calls == 0
+    assert len(router.latencies) == 1
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    primary, secondary = FakeBackend("primary", 0.5), FakeBackend("secondary", 0.01)
+    router = HedgedRouter(primary, secondary, initial_delay=0.05)
+    assert run(router) == ["secondary"]
+    assert primary.cancelled == 1
+
+
+def test_cancelled_primary_latency_is_recorded():
+    primary, secondary = FakeBackend("primary", 0.05), FakeBackend("secondary", 0.01)
+    router = HedgedRouter(primary, secondary, initial_delay=0.02, min_samples=3)
+    run(router, times=10)
+    assert len(router.latencies) == 10
+    # Lower bounds of the primary's latency, never below the hedge delay
+    assert min(router.latencies) >= 0.02
+
+
+def test_failing_primary_falls_back_to_secondary():
+    primary = FakeBackend("primary", fail=True)
+    secondary = FakeBackend("secondary", 0.01)
+    router = HedgedRouter(primary, secondary, initial_delay=0.2)
+    assert run(router) == ["secondary"]
+
+
+def test_open_breaker_routes_around_primary():
+    primary = FakeBackend("primary", fail=True)
+    secondary = FakeBackend("secondary")
+    router = HedgedRouter(primary, secondary, initial_delay=0.2)
+    run(router, times=primary.breaker.failure_threshold)
+    assert primary.breaker.state == CircuitBreaker.OPEN
+    calls = primary.calls
+    assert run(router, times=3) == ["secondary"] * 3
+    assert primary.calls == calls
+
+
+def test_all_backends_failing_raises():
+    router = HedgedRouter(
+        FakeBackend("primary", fail=True), FakeBackend("secondary", fail=True)
+    )
+    with pytest.raises(RuntimeError):
+        run(router)
+
+
+def test_breaker_half_open_allows_single_probe():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.01)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert not breaker.allow_request()
+
+    time.sleep(0.02)
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_breaker_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_breaker_cancelled_probe_frees_slot():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow_request()
+    breaker.record_cancel()
+    assert breaker.allow_request()
+
+
+def test_run_sync_reuses_one_loop():
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    assert run_sync(current_loop()) is run_sync(current_loop())
+
+
+def test_open_breakers_fail_fast():
+    primary = FakeBackend("primary", fail=True)
+    router = HedgedRouter(primary)
+    for _ in range(primary.breaker.failure_threshold):
+        with pytest.raises(RuntimeError):
+            run(router)
+    calls = primary.calls
+    with pytest.raises(BackendUnavailable):
+        run(router)
+    assert primary.calls == calls
+
+
+@pytest.fixture
+def groq_env(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test")
+
+    def point_at(server):
+        monkeypatch.setenv("GROQ_BASE_URL", server.url)
+
+    return point_at
+
+
+def test_groq_backend_against_standin(groq_env):
+    with StandinServer(content='{"summary": "from groq"}') as server:
+        groq_env(server)
+        backend = GroqBackend()
+
+        async def go():
+            first = await backend.complete([{"role": "user", "content": "hi"}])
+            # The client is cached for the loop and reused
+            assert backend.client() is backend.client()
+            return first
+
+        assert asyncio.run(go()) == '{"summary": "from groq"}'
+
+
+def test_groq_backend_does_not_retry_errors(groq_env):
+    with StandinServer(status=503) as server:
+        groq_env(server)
+        with pytest.raises(Exception):
+            asyncio.run(GroqBackend().complete([{"role": "user", "content": "hi"}]))
+        # Retries are left to the caller, which backs off between them
+        assert server.requests == 1
+
+
+def test_ollama_backend_against_standin():
+    with StandinServer(content='{"summary": "from ollama"}') as server:
+        backend = OllamaBackend(host=server.url)
+        result = asyncio.run(backend.complete([{"role": "user", "content": "hi"}]))
+        assert result == '{"summary": "from ollama"}'
+
+
+def test_slow_groq_is_hedged_to_ollama(groq_env):
+    with StandinServer(delay=1.0, content='{"summary": "groq"}') as slow, \
+            StandinServer(content='{"summary": "ollama"}') as fast:
+        groq_env(slow)
+        router = HedgedRouter(
+            GroqBackend(), OllamaBackend(host=fast.url), initial_delay=0.1
+        )
+        assert run(router) == ['{"summary": "ollama"}']
+        assert len(router.latencies) == 1
+
+
+def test_failing_groq_fails_over_to_ollama(groq_env):
+    with StandinServer(status=429) as failing, \
+            StandinServer(content='{"summary": "ollama"}') as healthy:
+        groq_env(failing)
+        router = HedgedRouter(
+            GroqBackend(), OllamaBackend(host=healthy.url), initial_delay=0.5
+        )
+        assert run(router, times=4) == ['{"summary": "ollama"}'] * 4
+        assert router.primary.breaker.state == CircuitBreaker.OPEN
+        assert failing.requests == router.primary.breaker.failure_threshold
@@ -0,0 +1,46 @@
+from src.prompt_format import encode_document, encode_events, encode_summaries
+
+
+def test_encode_document_sends_only_whitelisted_metadata():
+    doc = {
+        "content": "hello",
+        "file_path": "/home/user/Downloads/notes.txt",
+        "file_name": "notes.txt",
+        "file_type": "text/plain",
+        "file_size": 5,
+        "creation_date": "2024-05-01",
+        "last_modified_date": "2024-05-02",
+        "last_accessed_date": "2024-05-03",
+    }
+    assert encode_document(doc) == (
+        "file: notes.txt\n"
+        "type: text/plain\n"
+        "modified: 2024-05-02\n"
+        "\n"
+        "hello"
+    )
+
+
+def test_encode_document_skips_missing_and_empty_metadata():
+    doc = {"content": "hello", "file_name": "notes.txt", "file_type": ""}
+    assert encode_document(doc) == "file: notes.txt\n\nhello"
+
+
+def test_encode_summaries_keeps_one_row_per_file():
+    summaries = [
+        {"file_path": "docs/a.txt", "summary": "first line\nsecond\tline"},
+        {"file_path": "b.pdf", "summary": "  padded  "},
+    ]
+    assert encode_summaries(summaries) == (
+        "path\tsummary\n"
+        "docs/a.txt\tfirst line second line\n"
+        "b.pdf\tpadded"
+    )
+
+
+def test_encode_events():
+    events = [
+        {"src_path": "a.txt", "dst_path": "notes/a.txt"},
+        {"src_path": "b.pdf", "dst_path": "taxes/2023/b.pdf"},
+    ]
+    assert encode_events(events) == "a.txt -> notes/a.txt\nb.pdf -> taxes/2023/b.pdf"
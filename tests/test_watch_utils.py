@@ -0,0 +1,98 @@
+import os
+import queue
+import shutil
+
+import pytest
+
+from src import watch_utils
+from src.watch_utils import Handler
+
+
+@pytest.fixture
+def handler(tmp_path):
+    handler = Handler(str(tmp_path), callback=None, queue=queue.Queue())
+    handler.summaries_cache = {
+        path: {"file_path": path, "summary": f"about {path}"}
+        for path in ["a.txt", os.path.join("d", "x.txt"), os.path.join("d", "y.txt"),
+                     os.path.join("ab", "z.txt")]
+    }
+    handler.summaries = list(handler.summaries_cache.values())
+    yield handler
+    handler.stop()
+
+
+def test_move_completed_remaps_everything_under_a_directory(handler, tmp_path):
+    src, dst = tmp_path / "d", tmp_path / "e"
+    handler.expect_move(src, dst)
+    handler.move_completed(src, dst)
+    assert sorted(handler.summaries_cache) == sorted(
+        ["a.txt", os.path.join("ab", "z.txt"),
+         os.path.join("e", "x.txt"), os.path.join("e", "y.txt")]
+    )
+    entry = handler.summaries_cache[os.path.join("e", "x.txt")]
+    assert entry == {"file_path": os.path.join("e", "x.txt"),
+                     "summary": f"about {os.path.join('d', 'x.txt')}"}
+    assert handler.summaries == list(handler.summaries_cache.values())
+
+
+def test_move_out_of_base_drops_summary(handler, tmp_path):
+    handler.move_completed(tmp_path / "a.txt", tmp_path.parent / "elsewhere.txt")
+    assert "a.txt" not in handler.summaries_cache
+    assert handler.is_expected("a.txt")
+
+
+def test_move_from_outside_base_is_not_suppressed(handler, tmp_path):
+    handler.expect_move(tmp_path.parent / "outside.txt", tmp_path / "inside.txt")
+    handler.move_completed(tmp_path.parent / "outside.txt", tmp_path / "inside.txt")
+    assert not handler.is_expected("inside.txt")
+
+
+def test_failed_move_leaves_cache_unchanged(handler, tmp_path):
+    before = dict(handler.summaries_cache)
+    handler.expect_move(tmp_path / "d", tmp_path / "e")
+    # shutil.move raised, so move_completed is never called
+    assert handler.summaries_cache == before
+    assert handler.is_expected(os.path.join("d", "x.txt"), os.path.join("e", "x.txt"))
+
+
+def test_sibling_sharing_a_prefix_is_not_matched(handler, tmp_path):
+    handler.expect_move(tmp_path / "a", tmp_path / "b")
+    handler.move_completed(tmp_path / "a", tmp_path / "b")
+    assert not handler.is_expected(os.path.join("ab", "z.txt"))
+    assert os.path.join("ab", "z.txt") in handler.summaries_cache
+
+
+def test_expectation_expires(handler, tmp_path):
+    handler.expect_move(tmp_path / "a.txt", tmp_path / "b.txt", ttl=0)
+    assert not handler.is_expected("a.txt")
+
+
+def test_update_summary_drops_result_for_file_moved_meanwhile(
+    handler, tmp_path, monkeypatch
+):
+    (tmp_path / "a.txt").write_text("hello")
+
+    def summarize_while_committing(path):
+        # A commit moves the file while the LLM call is in flight
+        handler.expect_move(tmp_path / "a.txt", tmp_path / "notes" / "a.txt")
+        os.makedirs(tmp_path / "notes")
+        shutil.move(tmp_path / "a.txt", tmp_path / "notes" / "a.txt")
+        handler.move_completed(tmp_path / "a.txt", tmp_path / "notes" / "a.txt")
+        return {"file_path": path, "summary": "stale"}
+
+    monkeypatch.setattr(watch_utils, "get_file_summary", summarize_while_committing)
+    handler.update_summary("a.txt")
+    assert "a.txt" not in handler.summaries_cache
+    assert handler.summaries_cache[os.path.join("notes", "a.txt")]["summary"] == "about a.txt"
+    assert handler.queue.empty()
+
+
+def test_update_summary_stores_fresh_result(handler, tmp_path, monkeypatch):
+    (tmp_path / "new.txt").write_text("hello")
+    monkeypatch.setattr(
+        watch_utils, "get_file_summary",
+        lambda path: {"file_path": path, "summary": "fresh"},
+    )
+    handler.update_summary("new.txt")
+    assert handler.summaries_cache["new.txt"] == {"file_path": "new.txt", "summary": "fresh"}
+    assert handler.queue.get_nowait()["files"][0]["summary"] == "fresh"